@@ -1,16 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from app.scraper import scrape_all
-from typing import List, Dict
-from app.models import User
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import ORJSONResponse
+from app.scraper import cached_snapshot, scrape_all_snapshot
+from typing import List, Dict, Optional, Tuple
+from app.models import User, SearchHistory
 from app.recommender import get_recommendations_user_based, get_recommendations_item_based
-from app.auth.deps import get_current_user, get_db
+from app.auth.deps import get_current_user, get_current_user_optional, get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from app.nlp_module import handle_conversation
+import base64
+import hashlib
 import logging
 
-# Initialize the router
-router = APIRouter()
+# Initialize the router, serializing responses with orjson
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -24,6 +27,97 @@ class UserMessage(BaseModel):
 class BotResponse(BaseModel):
     response: str
 
+# Define the data model for a scraped product
+class ProductItem(BaseModel):
+    name: str
+    image: str
+    price: str
+    link: str
+    rating: str
+
+# Define the data model for a page of scraped products
+class ProductPage(BaseModel):
+    products: List[ProductItem]
+    total: int
+    next_cursor: Optional[str] = None
+
+# Define the data model for a recommended product
+class RecommendationItem(BaseModel):
+    title: str
+    rating: float
+
+# Define the data model for a page of recommendations
+class RecommendationPage(BaseModel):
+    recommendations: List[RecommendationItem]
+    total: int
+    next_cursor: Optional[str] = None
+
+# Default and maximum page sizes for paginated endpoints
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(offset: int, snapshot: str) -> str:
+    """
+    Build the opaque cursor of the page starting at `offset` within the
+    results identified by `snapshot`.
+    """
+    return base64.urlsafe_b64encode(f"{offset}:{snapshot}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[int, Optional[str]]:
+    """
+    Turn a cursor, as returned in `next_cursor` by the previous page, into the
+    offset of the first item of the page and the snapshot it was sliced from.
+    No cursor means the first page, of whatever the results are now.
+    """
+    if not cursor:
+        return 0, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        offset, snapshot = raw.split(":", 1)
+        offset = int(offset)
+    except ValueError:
+        offset, snapshot = -1, ""
+    if offset < 0 or not snapshot:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return offset, snapshot
+
+def check_snapshot(cursor_snapshot: Optional[str], snapshot: Optional[str]) -> None:
+    """
+    Reject a cursor issued for results that have since been replaced, slicing
+    the new results at its offset would skip or repeat items.
+    """
+    if cursor_snapshot is not None and cursor_snapshot != snapshot:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="The results changed since this cursor was issued, start again from the first page.")
+
+def results_snapshot(items: List[Dict]) -> str:
+    """
+    Identify results that are computed on every request by their content.
+    """
+    return hashlib.sha1(repr(items).encode()).hexdigest()[:16]
+
+def paginate(items: List[Dict], offset: int, limit: int, snapshot: str) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Slice a page out of `items`, returning it with the cursor of the next page.
+    """
+    end = offset + limit
+    next_cursor = encode_cursor(end, snapshot) if end < len(items) else None
+    return items[offset:end], next_cursor
+
+async def record_search(db: AsyncSession, user_id: int, product_name: str, total: int) -> None:
+    """
+    Store a search in the history the same way a chat "search ..." message is
+    stored, so the prewarm crawler counts both alike.
+    """
+    try:
+        db.add(SearchHistory(user_id=user_id, query=f"search {product_name}"[:255],
+                             results={"source": "scrape", "total": total}))
+        await db.commit()
+    except Exception as e:
+        # Losing a history entry must not fail the search itself
+        logger.error(f"Error recording search history: {e}")
+        await db.rollback()
+
 # Chat endpoint - interacts with the NLP module
 @router.post("/chat", response_model=BotResponse)
 async def chat(user_message: UserMessage, db: AsyncSession = Depends(get_db)):
@@ -41,72 +135,111 @@ async def chat(user_message: UserMessage, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Internal Server Error: Chat processing failed.")
 
 # Scrape endpoint - scrapes products from multiple sources
-@router.get("/scrape", response_model=List[Dict[str, str]])
-async def scrape(product_name: str) -> List[Dict[str, str]]:
+@router.get("/scrape", response_model=ProductPage)
+async def scrape(product_name: str, cursor: Optional[str] = None,
+                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                 db: AsyncSession = Depends(get_db),
+                 current_user: Optional[User] = Depends(get_current_user_optional)):
+    # Reject a bad cursor before paying for the scrape
+    offset, cursor_snapshot = decode_cursor(cursor)
     try:
         logger.info(f"Scraping for product: {product_name}")
         
-        # Scrape the product data from all platforms
-        products = await scrape_all(product_name)
+        if cursor_snapshot is None:
+            # Scrape the product data from all platforms, unless recently cached
+            snapshot, products = await scrape_all_snapshot(product_name)
+        else:
+            # Later pages only come from the cached results the first page came
+            # from, an expired or re-scraped entry can't be sliced consistently
+            snapshot, products = cached_snapshot(product_name) or (None, [])
+            check_snapshot(cursor_snapshot, snapshot)
+        
+        # Record new searches by signed-in users so the prewarm crawler sees them
+        if current_user is not None and cursor_snapshot is None:
+            await record_search(db, current_user.id, product_name, len(products))
         
-        return products
+        page, next_cursor = paginate(products, offset, limit, snapshot)
+        return {"products": page, "total": len(products), "next_cursor": next_cursor}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in scraping products: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error: Scraping failed.")
 
 # Recommendations endpoint - gets item-based recommendations for the current user
-@router.get("/recommendations", response_model=Dict[str, List[Dict[str, str]]])
-async def recommendations(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/recommendations", response_model=RecommendationPage)
+async def recommendations(cursor: Optional[str] = None,
+                          limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    offset, cursor_snapshot = decode_cursor(cursor)
     try:
         logger.info(f"Fetching item-based recommendations for user: {current_user.id}")
         
         # Get item-based recommendations for the user
         recommendations = await get_recommendations_item_based(current_user.id, db)
         
-        # Return recommendations as a list of dictionaries
-        return {"recommendations": recommendations.to_dict(orient='records')}
+        snapshot = results_snapshot(recommendations)
+        check_snapshot(cursor_snapshot, snapshot)
+        page, next_cursor = paginate(recommendations, offset, limit, snapshot)
+        return {"recommendations": page, "total": len(recommendations), "next_cursor": next_cursor}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in fetching recommendations: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error: Recommendation fetching failed.")
 
 # User-based recommendations endpoint - gets user-based recommendations by user ID
-@router.get("/recommendations/user_based/{user_id}", response_model=List[Dict[str, str]])
-async def user_based_recommendations(user_id: int, db: AsyncSession = Depends(get_db)):
+@router.get("/recommendations/user_based/{user_id}", response_model=RecommendationPage)
+async def user_based_recommendations(user_id: int, cursor: Optional[str] = None,
+                                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                     db: AsyncSession = Depends(get_db)):
+    offset, cursor_snapshot = decode_cursor(cursor)
     try:
         logger.info(f"Fetching user-based recommendations for user: {user_id}")
         
         # Get user-based recommendations for the specified user
-        recommendations_df = await get_recommendations_user_based(user_id, db)
+        recommendations = await get_recommendations_user_based(user_id, db)
         
         # Check if no recommendations are found
-        if recommendations_df.empty:
+        if not recommendations:
             raise HTTPException(status_code=404, detail="No recommendations found for this user.")
         
-        # Return the recommendations as a list of dictionaries
-        return recommendations_df.to_dict(orient="records")
+        snapshot = results_snapshot(recommendations)
+        check_snapshot(cursor_snapshot, snapshot)
+        page, next_cursor = paginate(recommendations, offset, limit, snapshot)
+        return {"recommendations": page, "total": len(recommendations), "next_cursor": next_cursor}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in fetching user-based recommendations: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error: User-based recommendation fetching failed.")
 
 # Item-based recommendations endpoint - gets item-based recommendations by user ID
-@router.get("/recommendations/item_based/{user_id}", response_model=List[Dict[str, str]])
-async def item_based_recommendations(user_id: int, db: AsyncSession = Depends(get_db)):
+@router.get("/recommendations/item_based/{user_id}", response_model=RecommendationPage)
+async def item_based_recommendations(user_id: int, cursor: Optional[str] = None,
+                                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                     db: AsyncSession = Depends(get_db)):
+    offset, cursor_snapshot = decode_cursor(cursor)
     try:
         logger.info(f"Fetching item-based recommendations for user: {user_id}")
         
         # Get item-based recommendations for the specified user
-        recommendations_df = await get_recommendations_item_based(user_id, db)
+        recommendations = await get_recommendations_item_based(user_id, db)
         
         # Check if no recommendations are found
-        if recommendations_df.empty:
+        if not recommendations:
             raise HTTPException(status_code=404, detail="No recommendations found for this user.")
         
-        # Return the recommendations as a list of dictionaries
-        return recommendations_df.to_dict(orient="records")
+        snapshot = results_snapshot(recommendations)
+        check_snapshot(cursor_snapshot, snapshot)
+        page, next_cursor = paginate(recommendations, offset, limit, snapshot)
+        return {"recommendations": page, "total": len(recommendations), "next_cursor": next_cursor}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in fetching item-based recommendations: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error: Item-based recommendation fetching failed.")
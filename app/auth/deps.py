@@ -1,8 +1,10 @@
 # app/auth/deps.py
 
 from fastapi import Depends, HTTPException, status
+from typing import Optional
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from database import get_db
 from fastapi.security import OAuth2PasswordBearer
 from app.models import User
@@ -10,6 +12,7 @@ from app.auth.utils import SECRET_KEY, ALGORITHM
 
 # OAuth2PasswordBearer instance
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
     credentials_exception = HTTPException(
@@ -26,12 +29,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
 
-    result = await db.execute(
-        "SELECT * FROM users WHERE email = :email", {"email": email}
-    )
+    result = await db.execute(select(User).where(User.email == email))
     user = result.scalars().first()
 
     if user is None:
         raise credentials_exception
 
     return user
+
+async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme_optional), db: AsyncSession = Depends(get_db)) -> Optional[User]:
+    # Same as get_current_user, but anonymous or invalid tokens give None instead of a 401
+    if token is None:
+        return None
+    try:
+        return await get_current_user(token, db)
+    except HTTPException:
+        return None
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from app.auth.utils import create_access_token, hash_password, verify_password
 from app.models import User
 from database import get_db
@@ -22,9 +23,7 @@ class UserLogin(BaseModel):
 
 @router.post("/register")
 async def register(request: Request, user: UserRegister, db: AsyncSession = Depends(get_db)):
-    existing_user = await db.execute(
-        "SELECT * FROM users WHERE email = :email", {"email": user.email}
-    )
+    existing_user = await db.execute(select(User).where(User.email == user.email))
     existing_user = existing_user.scalars().first()
 
     if existing_user:
@@ -42,9 +41,7 @@ async def register(request: Request, user: UserRegister, db: AsyncSession = Depe
 
 @router.post("/login")
 async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        "SELECT * FROM users WHERE email = :email", {"email": user.email}
-    )
+    result = await db.execute(select(User).where(User.email == user.email))
     existing_user = result.scalars().first()
 
     if not existing_user or not verify_password(user.password, existing_user.password_hash):
@@ -0,0 +1,220 @@
+# app/model_server.py
+"""
+Out-of-process inference server for the conversational model.
+
+One server process holds a single copy of the model and serves generation
+requests from every web worker over a local socket, so uvicorn workers don't
+each load their own copy. Frames are a 4-byte big-endian length followed by a
+msgpack payload:
+
+    request:  {"prompt": str, "history": [str, ...]}
+    response: {"text": str} or {"error": str}
+
+Run it next to the web workers and point them at it with MODEL_SERVER_ADDRESS,
+either "unix:/path/to/socket" or "host:port":
+
+    MODEL_SERVER_ADDRESS=unix:/tmp/shopbot-model.sock python -m app.model_server
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import msgpack
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # bytes
+
+
+def load_model(model_name: str):
+    """
+    Load the pre-trained conversational model and its tokenizer.
+    """
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    return tokenizer, model
+
+
+def generate_text(tokenizer, model, prompt: str, history: List[str]) -> str:
+    """
+    Generate a response from the conversational model.
+    """
+    input_text = ' '.join(history + [prompt])
+    inputs = tokenizer.encode(input_text, return_tensors='pt')
+    response = model.generate(inputs, max_length=1000, pad_token_id=tokenizer.eos_token_id)
+    return tokenizer.decode(response[:, inputs.shape[-1]:][0], skip_special_tokens=True)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        return None  # Connection closed between frames
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return msgpack.unpackb(await reader.readexactly(size), raw=False)
+
+
+def write_frame(writer: asyncio.StreamWriter, message: dict) -> None:
+    payload = msgpack.packb(message, use_bin_type=True)
+    writer.write(HEADER.pack(len(payload)) + payload)
+
+
+def parse_address(address: str) -> Tuple[str, object]:
+    """
+    Split a server address into ("unix", path) or ("tcp", (host, port)).
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+async def open_connection(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    kind, target = parse_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target)
+    return await asyncio.open_connection(*target)
+
+
+class ModelServer:
+    """
+    Serves generation requests from a single in-memory model. Generation runs
+    on one dedicated thread, so requests from all connections are queued
+    behind each other instead of competing for the same model.
+    """
+
+    def __init__(self, model_name: str, address: str):
+        self.model_name = model_name
+        self.address = address
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+        self.tokenizer = None
+        self.model = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                try:
+                    text = await loop.run_in_executor(
+                        self.executor, generate_text, self.tokenizer, self.model,
+                        request["prompt"], list(request.get("history", [])),
+                    )
+                    write_frame(writer, {"text": text})
+                except Exception as e:
+                    logger.error(f"Error generating response: {e}")
+                    write_frame(writer, {"error": str(e)})
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(f"Dropping model server connection: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        logger.info(f"Loading model {self.model_name}")
+        self.tokenizer, self.model = await loop.run_in_executor(self.executor, load_model, self.model_name)
+
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            # Remove a socket left behind by a previous run
+            if os.path.exists(target):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(self.handle_connection, target)
+        else:
+            server = await asyncio.start_server(self.handle_connection, *target)
+
+        logger.info(f"Model server listening on {self.address}")
+        async with server:
+            await server.serve_forever()
+
+
+class ModelClient:
+    """
+    Client used by the web workers. Keeps idle connections open for reuse and
+    returns None from `generate` when no server is listening, so callers can
+    fall back to an in-process model.
+    """
+
+    def __init__(self, address: str, timeout: float = 120.0):
+        self.address = address
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    def _idle_connection(self) -> Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        return None
+
+    def _drop_idle(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    async def _request(self, connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter],
+                       prompt: str, history: List[str]) -> str:
+        reader, writer = connection
+        try:
+            write_frame(writer, {"prompt": prompt, "history": history})
+            await writer.drain()
+            response = await asyncio.wait_for(read_frame(reader), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if response is None:
+            writer.close()
+            raise ConnectionError("Model server closed the connection")
+        self._idle.append((reader, writer))
+        if "error" in response:
+            raise RuntimeError(f"Model server error: {response['error']}")
+        return response["text"]
+
+    async def generate(self, prompt: str, history: List[str]) -> Optional[str]:
+        connection = self._idle_connection()
+        if connection is not None:
+            try:
+                return await self._request(connection, prompt, history)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                # The server restarted or went away since this connection was
+                # last used, the other idle connections are just as stale
+                logger.info(f"Reconnecting to model server after a stale connection: {e}")
+                self._drop_idle()
+
+        try:
+            connection = await open_connection(self.address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        return await self._request(connection, prompt, history)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the conversational model to all web workers.")
+    parser.add_argument("--address", default=settings.MODEL_SERVER_ADDRESS or "unix:/tmp/shopbot-model.sock",
+                        help='"unix:/path/to/socket" or "host:port"')
+    parser.add_argument("--model", default=settings.NLP_MODEL_NAME, help="model id or local path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(ModelServer(args.model, args.address).serve())
+
+
+if __name__ == "__main__":
+    main()
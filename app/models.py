@@ -17,6 +17,8 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    search_histories = relationship("SearchHistory", back_populates="user")
+
 class SearchHistory(Base):
     __tablename__ = 'search_history'
 
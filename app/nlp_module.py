@@ -1,24 +1,63 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Union
 from app.recommender import get_recommendations_user_based, get_recommendations_item_based
-from app.scraper import scrape_all
+from app.scraper import scrape_all_cached
+from app.model_server import ModelClient, generate_text, load_model
+from app.profiling import profiled_call
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models import SearchHistory
-# Load the pre-trained conversational model
-model_name = 'microsoft/DialoGPT-medium'
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(model_name)
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shared model server, when configured (see app/model_server.py)
+model_client = ModelClient(settings.MODEL_SERVER_ADDRESS) if settings.MODEL_SERVER_ADDRESS else None
+
+# The pre-trained conversational model, loaded in this process only when needed.
+# Loading and generation run on a single dedicated thread, so they never block
+# the event loop and the model is only ever loaded once.
+model_name = settings.NLP_MODEL_NAME
+model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+tokenizer = None
+model = None
+falling_back = False
+
+def get_local_model():
+    global tokenizer, model
+    if model is None:
+        logger.info(f"Loading model {model_name} in-process")
+        tokenizer, model = load_model(model_name)
+    return tokenizer, model
+
+def generate_local(prompt: str, history: List[str]) -> str:
+    return generate_text(*get_local_model(), prompt, history)
+
+async def load_local_model() -> None:
+    """
+    Load the in-process model without blocking the event loop.
+    """
+    await asyncio.get_running_loop().run_in_executor(model_executor, get_local_model)
 
 async def generate_response(prompt: str, history: List[str]) -> str:
     """
-    Generate a response from the conversational model.
+    Generate a response from the conversational model, using the shared model
+    server when one is running and the in-process model otherwise.
     """
-    input_text = ' '.join(history + [prompt])
-    inputs = tokenizer.encode(input_text, return_tensors='pt')
-    response = model.generate(inputs, max_length=1000, pad_token_id=tokenizer.eos_token_id)
-    response_text = tokenizer.decode(response[:, inputs.shape[-1]:][0], skip_special_tokens=True)
-    return response_text
+    global falling_back
+    if model_client is not None:
+        response_text = await model_client.generate(prompt, history)
+        if response_text is not None:
+            falling_back = False
+            return response_text
+        # Falling back costs a full model copy in this worker, make it visible
+        if not falling_back:
+            logger.warning(f"Model server at {settings.MODEL_SERVER_ADDRESS} is not reachable, "
+                           f"generating in-process with a local copy of {model_name}")
+            falling_back = True
+    return await asyncio.get_running_loop().run_in_executor(model_executor, profiled_call(generate_local), prompt, history)
 
 async def handle_query(user_query: str, user_id: int, db: AsyncSession) -> str:
     """
@@ -35,7 +74,7 @@ async def handle_query(user_query: str, user_id: int, db: AsyncSession) -> str:
     # Check if the query relates to searching for products
     elif 'search' in user_query.lower():
         product_name = user_query.lower().replace('search', '').strip()
-        products = await scrape_all(product_name)
+        products = await scrape_all_cached(product_name)
         if products:
             response = f"I found these products for you: {', '.join([product['name'] for product in products[:5]])}."
         else:
@@ -51,10 +90,9 @@ async def handle_conversation(user_id: int, message: str, db: AsyncSession) -> s
     Handle conversation history and provide responses.
     """
     # Retrieve or initialize conversation history
-    async with db() as session:
-        stmt = select(SearchHistory).where(SearchHistory.user_id == user_id).order_by(SearchHistory.search_time.desc())
-        result = await session.execute(stmt)
-        history_entries = result.scalars().all()
+    stmt = select(SearchHistory).where(SearchHistory.user_id == user_id).order_by(SearchHistory.search_time.desc())
+    result = await db.execute(stmt)
+    history_entries = result.scalars().all()
 
     history = [entry.query for entry in history_entries]
     
@@ -63,8 +101,7 @@ async def handle_conversation(user_id: int, message: str, db: AsyncSession) -> s
     
     # Update conversation history
     new_history = SearchHistory(user_id=user_id, query=message, results={"response": response})
-    async with db() as session:
-        session.add(new_history)
-        await session.commit()
+    db.add(new_history)
+    await db.commit()
     
     return response
@@ -0,0 +1,245 @@
+# app/prewarm.py
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import Product, SearchHistory
+from app.scraper import SITE_SCRAPERS, marketplace_url, scrape_cache
+
+logger = logging.getLogger(__name__)
+
+
+def search_term(query: str) -> Optional[str]:
+    """
+    Extract the product name from a chat message, using the same rule as
+    `handle_query`: only messages mentioning 'search' are product searches.
+    """
+    lowered = query.lower()
+    if 'search' not in lowered:
+        return None
+    return lowered.replace('search', '').strip() or None
+
+
+async def popular_queries(session: AsyncSession, top_n: int, since: datetime) -> List[Tuple[str, int]]:
+    """
+    Return the `top_n` most searched product names since `since`, with their
+    number of searches, most popular first.
+    """
+    hits = func.count(SearchHistory.id)
+    stmt = (
+        select(SearchHistory.query, hits)
+        .where(SearchHistory.search_time >= since)
+        .where(SearchHistory.query.ilike('%search%'))
+        .group_by(SearchHistory.query)
+        .order_by(hits.desc())
+        .limit(top_n * 10)
+    )
+    result = await session.execute(stmt)
+
+    counts = Counter()
+    for query, count in result.all():
+        term = search_term(query)
+        if term:
+            counts[term] += count
+    return counts.most_common(top_n)
+
+
+def refresh_interval(hits: int, top_hits: int, min_interval: float, max_interval: float) -> float:
+    """
+    The most popular query is refreshed every `min_interval` seconds, less
+    popular ones proportionally less often, up to `max_interval`.
+    """
+    share = hits / top_hits if top_hits else 0.0
+    if share <= 0:
+        return max_interval
+    return max(min_interval, min(max_interval, min_interval / share))
+
+
+def parse_rating(rating: str) -> Optional[float]:
+    match = re.search(r"\d+(\.\d+)?", rating or "")
+    return float(match.group()) if match else None
+
+
+async def store_products(session: AsyncSession, results: Dict[str, List[Dict[str, str]]]) -> None:
+    """
+    Insert scraped products into the products table, updating the price and
+    rating of products already stored under the same link.
+    """
+    scraped = {}
+    for site, products in results.items():
+        for product in products:
+            # Links longer than the column are skipped rather than truncated,
+            # the link is what identifies a product between refreshes
+            if product['link'] and len(product['link']) <= 255:
+                scraped[product['link']] = (site, product)
+    if not scraped:
+        return
+
+    result = await session.execute(select(Product).where(Product.link.in_(list(scraped))))
+    existing = {product.link: product for product in result.scalars().all()}
+
+    for link, (site, product) in scraped.items():
+        row = existing.get(link)
+        if row is None:
+            row = Product(link=link, source=site)
+            session.add(row)
+        row.title = product['name'][:255]
+        row.price = product['price'][:50]
+        row.rating = parse_rating(product['rating'])
+    await session.commit()
+
+
+class SiteRateLimiter:
+    """
+    Spaces out requests to each marketplace by at least `min_interval` seconds.
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def wait(self, site: str) -> None:
+        async with self._locks[site]:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(site, now))
+            self._next_slot[site] = slot + self.min_interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+
+
+class PrewarmScheduler:
+    """
+    Background crawler that keeps the scrape cache and the products table warm
+    for the most popular recent searches.
+
+    Every `tick` seconds the scheduler mines `SearchHistory` for the top
+    queries and queues those whose refresh interval has elapsed; a fixed pool
+    of workers re-scrapes them, respecting a per-site rate limit. With several
+    uvicorn workers, only the process holding `lock_path` runs the scheduler,
+    so the rate limit holds for the whole deployment.
+    """
+
+    def __init__(self, session_factory, top_n: int = 20, lookback: timedelta = timedelta(days=7),
+                 workers: int = 2, min_interval: float = 300.0, max_interval: float = 3600.0,
+                 tick: float = 60.0, site_interval: float = 2.0, lock_path: Optional[str] = None):
+        self.session_factory = session_factory
+        self.top_n = top_n
+        self.lookback = lookback
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tick = tick
+        self.rate_limiter = SiteRateLimiter(site_interval)
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._queue: "asyncio.Queue[Tuple[str, float]]" = asyncio.Queue()
+        self._queued: Set[str] = set()
+        self._next_refresh: Dict[str, float] = {}
+        self._tasks: List[asyncio.Task] = []
+        # Concurrent refreshes often return the same products, and
+        # store_products' select-then-insert would store them twice
+        self._store_lock = asyncio.Lock()
+
+    def _acquire_lock(self) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            logger.warning("File locks are not supported here, every process will run the prewarm scheduler")
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def start(self) -> bool:
+        """
+        Start the scheduler, unless another process already holds the lock.
+        """
+        if self.lock_path and not self._acquire_lock():
+            logger.info(f"Prewarm scheduler already running in another process (pid {os.getpid()} skips it)")
+            return False
+        self._tasks.append(asyncio.create_task(self._schedule_loop()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(f"Prewarm scheduler started with {self.workers} workers")
+        return True
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _schedule_loop(self) -> None:
+        while True:
+            try:
+                await self.schedule_due()
+            except Exception as e:
+                logger.error(f"Error scheduling prewarm queries: {e}")
+            await asyncio.sleep(self.tick)
+
+    async def schedule_due(self) -> None:
+        since = datetime.utcnow() - self.lookback
+        async with self.session_factory() as session:
+            popular = await popular_queries(session, self.top_n, since)
+        if not popular:
+            return
+
+        top_hits = popular[0][1]
+        now = time.monotonic()
+        for term, hits in popular:
+            if term in self._queued or self._next_refresh.get(term, 0.0) > now:
+                continue
+            interval = refresh_interval(hits, top_hits, self.min_interval, self.max_interval)
+            self._queued.add(term)
+            self._queue.put_nowait((term, interval))
+
+    async def _worker(self) -> None:
+        while True:
+            term, interval = await self._queue.get()
+            try:
+                await self.refresh(term, interval)
+            except Exception as e:
+                logger.error(f"Error prewarming '{term}': {e}")
+            finally:
+                self._queued.discard(term)
+                self._next_refresh[term] = time.monotonic() + interval
+                self._queue.task_done()
+
+    async def refresh(self, term: str, interval: float) -> None:
+        """
+        Re-scrape `term` on every marketplace and store the fresh results.
+        """
+        async def scrape_site(site: str) -> Tuple[str, List[Dict[str, str]]]:
+            await self.rate_limiter.wait(site)
+            return site, await SITE_SCRAPERS[site](marketplace_url(site, term))
+
+        results = dict(await asyncio.gather(*(scrape_site(site) for site in SITE_SCRAPERS)))
+        products = [product for site_products in results.values() for product in site_products]
+        if not products:
+            logger.info(f"Prewarm found no products for '{term}'")
+            return
+
+        # Keep the entry warm until the next refresh is due
+        scrape_cache.put(term, products, ttl=interval + self.tick)
+        async with self._store_lock, self.session_factory() as session:
+            await store_products(session, results)
+        logger.info(f"Prewarmed '{term}' with {len(products)} products")
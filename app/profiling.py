@@ -0,0 +1,373 @@
+# app/profiling.py
+
+import asyncio
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import logging
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Header and query flag used to opt a request into profiling
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_QUERY_PARAM = "__profile"
+REQUEST_ID_HEADER = b"x-request-id"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Interval between stack samples taken from the threads working on a request
+SAMPLE_INTERVAL = 0.005  # seconds
+
+# Profile of the request being handled, inherited by the tasks it creates
+_active_profile: contextvars.ContextVar = contextvars.ContextVar("active_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Profiling data captured for a single request.
+    """
+
+    def __init__(self, request_id: str, method: str, path: str, client_request_id: Optional[str] = None):
+        self.request_id = request_id
+        self.client_request_id = client_request_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.perf_start = time.perf_counter()
+        self.status_code: Optional[int] = None
+        self.wall_time = 0.0
+        self.cpu_steps = 0
+        self.cpu_time = 0.0
+        self.awaits: List[Dict[str, object]] = []
+        self.stacks: Counter = Counter()
+        self.profiler = cProfile.Profile()
+        # Profilers of calls made on executor threads, cProfile is per thread
+        self.thread_profilers: List[cProfile.Profile] = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add_cpu_time(self, seconds: float, profiler: Optional[cProfile.Profile] = None) -> None:
+        with self._lock:
+            self.cpu_steps += 1
+            self.cpu_time += seconds
+            if profiler is not None:
+                self.thread_profilers.append(profiler)
+
+    def pstats_text(self, limit: int = 50) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        for profiler in self.thread_profilers:
+            stats.add(profiler)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def collapsed_stacks(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, object]:
+        # Slowest awaits first, they are usually what we are looking for
+        awaits = sorted(self.awaits, key=lambda entry: entry["seconds"], reverse=True)
+        return {
+            "request_id": self.request_id,
+            "client_request_id": self.client_request_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "status_code": self.status_code,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "await_time": sum(entry["seconds"] for entry in self.awaits),
+            "cpu_steps": self.cpu_steps,
+            "samples": sum(self.stacks.values()),
+            "awaits": awaits,
+        }
+
+
+class ProfileStore:
+    """
+    Bounded in-memory store of recent request profiles, keyed by the
+    server-generated profile id.
+    """
+
+    def __init__(self, max_entries: int = 100):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles[profile.request_id] = profile
+            self._profiles.move_to_end(profile.request_id)
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(request_id)
+
+    def list(self) -> List[Dict[str, object]]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {"request_id": p.request_id, "client_request_id": p.client_request_id,
+             "path": p.path, "status_code": p.status_code, "wall_time": p.wall_time}
+            for p in reversed(profiles)
+        ]
+
+
+def _describe_await(coro) -> str:
+    """
+    Follow the chain of awaited coroutines down to the innermost one that is
+    currently suspended, returning the chain as a collapsed stack.
+    """
+    names = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return ";".join(names) or "<unknown>"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def is_authorized(scope, token: str) -> bool:
+    """
+    Check the profiling token sent in the header or query flag of a request.
+    """
+    if not token:
+        return False
+    expected = token.encode()
+    for name, value in scope.get("headers", ()):
+        if name == PROFILE_HEADER:
+            return hmac.compare_digest(value, expected)
+    query = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() in query:
+        for pair in query.split(b"&"):
+            key, _, value = pair.partition(b"=")
+            if key == PROFILE_QUERY_PARAM.encode():
+                return hmac.compare_digest(value, expected)
+    return False
+
+
+class _StackSampler(threading.Thread):
+    """
+    Periodically samples the stacks of the threads currently working on the
+    profiled request: the event loop thread while one of the request's tasks
+    is running on it, and executor threads during calls made for the request.
+    """
+
+    def __init__(self, profile: RequestProfile, interval: float):
+        super().__init__(daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self.threads: Set[int] = set()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            threads = tuple(self.threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.profile.stacks[_collapse(frame)] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class _ProfiledCoroutine:
+    """
+    Drives a coroutine step by step so that time spent running (CPU) can be
+    told apart from time spent suspended on awaits (wall clock). Awaits are
+    only recorded for the request's own coroutine, not for the tasks it
+    spawns, which run concurrently with it.
+    """
+
+    def __init__(self, coro, profile: RequestProfile, sampler: _StackSampler, record_awaits: bool = True):
+        self.coro = coro
+        self.profile = profile
+        self.sampler = sampler
+        self.record_awaits = record_awaits
+
+    def __await__(self):
+        coro, profile, sampler = self.coro, self.profile, self.sampler
+        thread_id = threading.get_ident()
+        value, error = None, None
+        while True:
+            # Tasks can outlive the request, stop profiling them once it is done
+            profiling = not profile.finished
+            if profiling:
+                step_start = time.perf_counter()
+                sampler.threads.add(thread_id)
+                profile.profiler.enable()
+            try:
+                if error is not None:
+                    yielded = coro.throw(error)
+                else:
+                    yielded = coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if profiling:
+                    profile.profiler.disable()
+                    sampler.threads.discard(thread_id)
+                    profile.add_cpu_time(time.perf_counter() - step_start)
+
+            if not self.record_awaits:
+                try:
+                    value, error = (yield yielded), None
+                except BaseException as e:
+                    value, error = None, e
+                continue
+
+            awaiting = _describe_await(coro)
+            suspended_at = time.perf_counter()
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+            profile.awaits.append({
+                "at": suspended_at - profile.perf_start,
+                "seconds": time.perf_counter() - suspended_at,
+                "location": awaiting.rsplit(";", 1)[-1],
+                "stack": awaiting,
+            })
+
+
+async def _profiled_task(coro, profile: RequestProfile, sampler: _StackSampler):
+    return await _ProfiledCoroutine(coro, profile, sampler, record_awaits=False)
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Make tasks created while a profiled request is being handled (e.g. by
+    `asyncio.gather`) count towards that request's profile.
+    """
+    previous = loop.get_task_factory()
+    if getattr(previous, "profiling", False):
+        return
+
+    def task_factory(loop, coro, **kwargs):
+        active = _active_profile.get()
+        if active is not None and asyncio.iscoroutine(coro):
+            coro = _profiled_task(coro, *active)
+        if previous is not None:
+            return previous(loop, coro, **kwargs)
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    task_factory.profiling = True
+    loop.set_task_factory(task_factory)
+
+
+def profiled_call(func):
+    """
+    Wrap `func` before handing it to an executor so that, when called while a
+    request is being profiled, its work on the executor thread is included in
+    the request's profile. Outside profiled requests `func` is returned as is.
+    """
+    active = _active_profile.get()
+    if active is None:
+        return func
+    profile, sampler = active
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        thread_id = threading.get_ident()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        sampler.threads.add(thread_id)
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            sampler.threads.discard(thread_id)
+            profile.add_cpu_time(time.perf_counter() - start, profiler)
+
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles requests carrying a valid profiling token
+    (header or query flag) plus a random sample of all other requests.
+    Requests that are not selected go straight to the wrapped app.
+    """
+
+    def __init__(self, app, token: str = "", sample_rate: float = 0.0,
+                 store: Optional[ProfileStore] = None, sample_interval: float = SAMPLE_INTERVAL,
+                 exclude_paths: Tuple[str, ...] = ()):
+        self.app = app
+        self.token = token
+        # Sampled profiles could never be read back without a token
+        if sample_rate > 0 and not token:
+            logger.warning("Profiling sample rate is set but no profiling token is configured, sampling disabled")
+            sample_rate = 0.0
+        self.sample_rate = sample_rate
+        self.store = store if store is not None else ProfileStore()
+        self.sample_interval = sample_interval
+        self.exclude_paths = tuple(exclude_paths)
+        self.enabled = bool(token) or sample_rate > 0
+
+    def _should_profile(self, scope) -> bool:
+        if scope["path"].startswith(self.exclude_paths):
+            return False
+        if is_authorized(scope, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # Profiles are stored under an id we generate, the client's own
+        # request id is only kept for reference so it can't overwrite others
+        client_request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_ID_HEADER:
+                client_request_id = value.decode("latin-1")
+                break
+        profile = RequestProfile(uuid.uuid4().hex, scope["method"], scope["path"], client_request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER, profile.request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        _install_task_factory(asyncio.get_running_loop())
+        sampler = _StackSampler(profile, self.sample_interval)
+        sampler.start()
+        active = _active_profile.set((profile, sampler))
+        try:
+            await _ProfiledCoroutine(self.app(scope, receive, send_wrapper), profile, sampler)
+        finally:
+            _active_profile.reset(active)
+            sampler.stop()
+            profile.finished = True
+            profile.wall_time = time.perf_counter() - profile.perf_start
+            self.store.add(profile)
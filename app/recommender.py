@@ -1,4 +1,5 @@
 from sklearn.metrics.pairwise import cosine_similarity
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import Product, SearchHistory
 from typing import List, Dict
@@ -7,12 +8,12 @@ import numpy as np
 # Function to get recommendations using user-based collaborative filtering
 async def get_recommendations_user_based(user_id: int, db: AsyncSession) -> List[Dict[str, str]]:
     # Fetch user ratings from the database
-    query = """
+    query = text("""
     SELECT sh.user_id, p.title, sh.results->>'rating' as rating
     FROM search_history sh
-    JOIN products p ON p.id = sh.results->>'product_id'
-    WHERE sh.user_id = :user_id
-    """
+    JOIN products p ON p.id = CAST(sh.results->>'product_id' AS INTEGER)
+    WHERE sh.user_id = :user_id AND sh.results->>'rating' IS NOT NULL
+    """)
     result = await db.execute(query, {"user_id": user_id})
     user_data = result.fetchall()
 
@@ -23,11 +24,12 @@ async def get_recommendations_user_based(user_id: int, db: AsyncSession) -> List
     user_ratings = [{"user_id": row[0], "title": row[1], "rating": float(row[2])} for row in user_data]
 
     # Fetch all user ratings for collaborative filtering
-    query_all = """
+    query_all = text("""
     SELECT sh.user_id, p.title, sh.results->>'rating' as rating
     FROM search_history sh
-    JOIN products p ON p.id = sh.results->>'product_id'
-    """
+    JOIN products p ON p.id = CAST(sh.results->>'product_id' AS INTEGER)
+    WHERE sh.results->>'rating' IS NOT NULL
+    """)
     result_all = await db.execute(query_all)
     all_data = result_all.fetchall()
 
@@ -73,12 +75,12 @@ async def get_recommendations_user_based(user_id: int, db: AsyncSession) -> List
 # Function to get recommendations using item-based collaborative filtering
 async def get_recommendations_item_based(user_id: int, db: AsyncSession) -> List[Dict[str, str]]:
     # Fetch user ratings from the database
-    query = """
+    query = text("""
     SELECT sh.user_id, p.title, sh.results->>'rating' as rating
     FROM search_history sh
-    JOIN products p ON p.id = sh.results->>'product_id'
-    WHERE sh.user_id = :user_id
-    """
+    JOIN products p ON p.id = CAST(sh.results->>'product_id' AS INTEGER)
+    WHERE sh.user_id = :user_id AND sh.results->>'rating' IS NOT NULL
+    """)
     result = await db.execute(query, {"user_id": user_id})
     user_data = result.fetchall()
 
@@ -89,11 +91,12 @@ async def get_recommendations_item_based(user_id: int, db: AsyncSession) -> List
     user_ratings = [{"user_id": row[0], "title": row[1], "rating": float(row[2])} for row in user_data]
 
     # Fetch all user ratings for collaborative filtering
-    query_all = """
+    query_all = text("""
     SELECT sh.user_id, p.title, sh.results->>'rating' as rating
     FROM search_history sh
-    JOIN products p ON p.id = sh.results->>'product_id'
-    """
+    JOIN products p ON p.id = CAST(sh.results->>'product_id' AS INTEGER)
+    WHERE sh.results->>'rating' IS NOT NULL
+    """)
     result_all = await db.execute(query_all)
     all_data = result_all.fetchall()
 
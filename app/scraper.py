@@ -1,13 +1,86 @@
 import asyncio
 import httpx
 from bs4 import BeautifulSoup
-from typing import List, Dict
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 from random import uniform
+from urllib.parse import urlsplit
+from config import settings
 
 # Delay between requests to throttle scraping
 MIN_DELAY = 1.0  # Minimum delay in seconds
 MAX_DELAY = 3.0  # Maximum delay in seconds
 
+# Search URL for each marketplace
+MARKETPLACE_URLS = {
+    "amazon": "https://www.amazon.com/s?k={query}",
+    "ebay": "https://www.ebay.com/sch/i.html?_nkw={query}",
+    "aliexpress": "https://www.aliexpress.com/wholesale?SearchText={query}",
+    "jumia": "https://www.jumia.com.ng/catalog/?q={query}",
+    "konga": "https://www.konga.com/search?search={query}",
+}
+
+# How long scraped results are served from the cache
+CACHE_TTL = 600.0  # seconds
+CACHE_MAX_ENTRIES = 500
+
+class ScrapeCache:
+    """
+    In-memory cache of recent scrape results keyed by product name, so pages of
+    the same search and repeated searches don't hit every marketplace again.
+    Every stored result list gets a new snapshot id, which lets paginated
+    responses tell when the results they were slicing have been replaced.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str, List[Dict[str, str]]]]" = OrderedDict()
+
+    @staticmethod
+    def _key(product_name: str) -> str:
+        return " ".join(product_name.lower().split())
+
+    def get_entry(self, product_name: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """
+        Return the snapshot id and products cached for `product_name`.
+        """
+        key = self._key(product_name)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, snapshot, products = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return snapshot, products
+
+    def get(self, product_name: str) -> Optional[List[Dict[str, str]]]:
+        entry = self.get_entry(product_name)
+        return entry[1] if entry is not None else None
+
+    def put(self, product_name: str, products: List[Dict[str, str]], ttl: Optional[float] = None) -> str:
+        key = self._key(product_name)
+        snapshot = uuid.uuid4().hex[:16]
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), snapshot, products)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return snapshot
+
+scrape_cache = ScrapeCache()
+
+def marketplace_url(site: str, product_name: str) -> str:
+    url = MARKETPLACE_URLS[site].format(query=product_name)
+    # Point the scraper at a stand-in server (e.g. the load-test marketplace)
+    if settings.MARKETPLACE_BASE_URL:
+        parts = urlsplit(url)
+        url = f"{settings.MARKETPLACE_BASE_URL.rstrip('/')}/{site}{parts.path}?{parts.query}"
+    return url
+
 async def fetch_page(url: str) -> str:
     async with httpx.AsyncClient() as client:
         try:
@@ -167,12 +240,21 @@ async def scrape_konga(url: str) -> List[Dict[str, str]]:
         return parse_product_data_konga(html)
     return []
 
+# Scraper for each marketplace, keyed like MARKETPLACE_URLS
+SITE_SCRAPERS = {
+    "amazon": scrape_amazon,
+    "ebay": scrape_ebay,
+    "aliexpress": scrape_aliexpress,
+    "jumia": scrape_jumia,
+    "konga": scrape_konga,
+}
+
 async def scrape_all(product_name: str) -> List[Dict[str, str]]:
-    amazon_url = f"https://www.amazon.com/s?k={product_name}"
-    ebay_url = f"https://www.ebay.com/sch/i.html?_nkw={product_name}"
-    aliexpress_url = f"https://www.aliexpress.com/wholesale?SearchText={product_name}"
-    jumia_url = f"https://www.jumia.com.ng/catalog/?q={product_name}"
-    konga_url = f"https://www.konga.com/search?search={product_name}"
+    amazon_url = marketplace_url("amazon", product_name)
+    ebay_url = marketplace_url("ebay", product_name)
+    aliexpress_url = marketplace_url("aliexpress", product_name)
+    jumia_url = marketplace_url("jumia", product_name)
+    konga_url = marketplace_url("konga", product_name)
 
     tasks = [
         scrape_amazon(amazon_url),
@@ -192,3 +274,30 @@ async def scrape_all(product_name: str) -> List[Dict[str, str]]:
         all_products.extend(result)
 
     return all_products
+
+
+async def scrape_all_snapshot(product_name: str) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """
+    Like `scrape_all_cached`, also returning the id of the cached snapshot the
+    products come from (None when an empty result was not cached).
+    """
+    entry = scrape_cache.get_entry(product_name)
+    if entry is not None:
+        return entry
+    products = await scrape_all(product_name)
+    # Don't cache a search that came back empty, it is usually a failed scrape
+    if not products:
+        return None, products
+    return scrape_cache.put(product_name, products), products
+
+
+async def scrape_all_cached(product_name: str) -> List[Dict[str, str]]:
+    _, products = await scrape_all_snapshot(product_name)
+    return products
+
+
+def cached_snapshot(product_name: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+    """
+    Return the cached snapshot of a search without scraping on a miss.
+    """
+    return scrape_cache.get_entry(product_name)
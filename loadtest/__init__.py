@@ -0,0 +1 @@
+#loadtest.__init__.py
\ No newline at end of file
@@ -0,0 +1,399 @@
+# loadtest/harness.py
+"""
+End-to-end load test for the ShopBot app.
+
+Boots `main.app` in a uvicorn subprocess against local stand-ins for all of
+its dependencies (a SQLite database, the recorded-HTML marketplace server and
+a tiny randomly initialised conversational model built in the workdir), drives each route with a configurable number of
+concurrent clients and reports RPS and p50/p95/p99 latency per route.
+
+    python -m loadtest.harness --routes login,scrape,chat --concurrency 16 --duration 20
+    python -m loadtest.harness --json-out after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.auth.utils import create_access_token, hash_password
+from app.models import Base, Product, SearchHistory, User
+from loadtest.marketplace import create_marketplace_app
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+LOADTEST_EMAIL = "loadtest@example.com"
+LOADTEST_PASSWORD = "loadtest-password"
+
+QUERIES = ["phone", "laptop", "earbuds", "smart watch", "power bank"]
+CHAT_MESSAGES = ["hello there", "search phone", "recommend something", "what is a good laptop?"]
+
+
+class RouteStats:
+    """
+    Latencies and outcomes collected for one route during one phase.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.outcomes: Counter = Counter()
+        self.elapsed = 0.0
+
+    def record(self, latency: float, outcome) -> None:
+        self.latencies.append(latency)
+        self.outcomes[str(outcome)] += 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, object]:
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "ok": sum(n for outcome, n in self.outcomes.items() if outcome.startswith("2")),
+            "outcomes": dict(self.outcomes),
+            "rps": count / self.elapsed if self.elapsed else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+        }
+
+
+class Context:
+    """
+    Seeded fixtures shared by the route workloads.
+    """
+
+    def __init__(self, user_id: int, token: str):
+        self.user_id = user_id
+        self.token = token
+
+
+# Workloads, each sends the i-th request for its route
+def _login(client: httpx.AsyncClient, ctx: Context, i: int) -> Awaitable[httpx.Response]:
+    return client.post("/auth/login", json={"email": LOADTEST_EMAIL, "password": LOADTEST_PASSWORD})
+
+def _scrape(client: httpx.AsyncClient, ctx: Context, i: int) -> Awaitable[httpx.Response]:
+    return client.get("/api/scrape", params={"product_name": QUERIES[i % len(QUERIES)]})
+
+def _chat(client: httpx.AsyncClient, ctx: Context, i: int) -> Awaitable[httpx.Response]:
+    return client.post("/api/chat", json={"user_id": ctx.user_id, "message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]})
+
+def _recommendations(client: httpx.AsyncClient, ctx: Context, i: int) -> Awaitable[httpx.Response]:
+    return client.get("/api/recommendations", headers={"Authorization": f"Bearer {ctx.token}"})
+
+def _recommendations_user(client: httpx.AsyncClient, ctx: Context, i: int) -> Awaitable[httpx.Response]:
+    return client.get(f"/api/recommendations/user_based/{ctx.user_id}")
+
+def _recommendations_item(client: httpx.AsyncClient, ctx: Context, i: int) -> Awaitable[httpx.Response]:
+    return client.get(f"/api/recommendations/item_based/{ctx.user_id}")
+
+WORKLOADS: Dict[str, Callable[[httpx.AsyncClient, Context, int], Awaitable[httpx.Response]]] = {
+    "login": _login,
+    "scrape": _scrape,
+    "chat": _chat,
+    "recommendations": _recommendations,
+    "recommendations_user": _recommendations_user,
+    "recommendations_item": _recommendations_item,
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_database(db_path: Path) -> Context:
+    """
+    Create the schema in a fresh SQLite file and add a login user, a few
+    products and some search history for the recommenders.
+    """
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(username="loadtest", email=LOADTEST_EMAIL, password_hash=hash_password(LOADTEST_PASSWORD))
+        other = User(username="loadtest-peer", email="peer@example.com", password_hash=hash_password(LOADTEST_PASSWORD))
+        session.add_all([user, other])
+        products = [
+            Product(title=f"{query.title()} {n}", price=f"{1000 * (n + 1)}", link=f"https://example.com/{query}/{n}",
+                    source="loadtest", rating=3.0 + n / 2)
+            for query in QUERIES for n in range(3)
+        ]
+        session.add_all(products)
+        session.flush()
+        for n, product in enumerate(products):
+            owner = user if n % 2 else other
+            session.add(SearchHistory(user_id=owner.id, query=f"search {product.title}",
+                                      results={"product_id": product.id, "rating": product.rating}))
+        session.commit()
+        user_id = user.id
+    engine.dispose()
+    return Context(user_id=user_id, token=create_access_token({"sub": LOADTEST_EMAIL}))
+
+
+def build_tiny_model(path: Path) -> Path:
+    """
+    Save a randomly initialised one-layer GPT-2 and a byte-level tokenizer to
+    `path`, standing in for DialoGPT without downloading anything. Its replies
+    are gibberish, but generation exercises the same code paths.
+    """
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast, set_seed
+
+    eos = "<|endoftext|>"
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=300, special_tokens=[eos],
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    tokenizer.train_from_iterator(QUERIES + CHAT_MESSAGES, trainer)
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token=eos, eos_token=eos).save_pretrained(path)
+
+    set_seed(0)
+    eos_id = tokenizer.token_to_id(eos)
+    config = GPT2Config(vocab_size=tokenizer.get_vocab_size(), n_positions=1024, n_embd=16, n_layer=1,
+                        n_head=2, bos_token_id=eos_id, eos_token_id=eos_id)
+    GPT2LMHeadModel(config).save_pretrained(path)
+    return path
+
+
+class MarketplaceServer:
+    """
+    Runs the recorded-HTML marketplace stand-in on a background thread.
+    """
+
+    def __init__(self, port: int, latency: float):
+        config = uvicorn.Config(create_marketplace_app(latency), host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.url = f"http://127.0.0.1:{port}"
+
+    def start(self) -> None:
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Marketplace server failed to start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def start_app(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=REPO_ROOT, env={**os.environ, **env})
+
+
+def start_model_server(address: str, model: str) -> subprocess.Popen:
+    command = [sys.executable, "-m", "app.model_server", "--address", address, "--model", model]
+    return subprocess.Popen(command, cwd=REPO_ROOT)
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float) -> None:
+    """
+    Wait for the model server to listen, it only does so once the model is loaded.
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Model server exited during startup with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"Model server did not become ready within {timeout:.0f}s")
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"App exited during startup with code {process.returncode}")
+            try:
+                response = await client.get("/api/test")
+                if response.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"App did not become ready within {timeout:.0f}s")
+
+
+async def run_phase(client: httpx.AsyncClient, name: str, ctx: Context, concurrency: int,
+                    duration: float, max_requests: int) -> RouteStats:
+    """
+    Drive one route with `concurrency` clients until `duration` seconds have
+    passed or `max_requests` requests were sent, whichever comes first.
+    """
+    send = WORKLOADS[name]
+    stats = RouteStats(name)
+    counter = itertools.count()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if (max_requests and i >= max_requests) or time.perf_counter() >= deadline:
+                return
+            sent_at = time.perf_counter()
+            try:
+                response = await send(client, ctx, i)
+                stats.record(time.perf_counter() - sent_at, response.status_code)
+            except httpx.HTTPError as e:
+                stats.record(time.perf_counter() - sent_at, type(e).__name__)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def print_report(results: Dict[str, Dict[str, object]], baseline: Optional[Dict[str, Dict[str, object]]]) -> None:
+    header = f"{'route':<22}{'reqs':>7}{'ok':>7}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, summary in results.items():
+        print(f"{name:<22}{summary['requests']:>7}{summary['ok']:>7}{summary['rps']:>10.1f}"
+              f"{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}")
+        if summary["ok"] != summary["requests"]:
+            print(f"{'':<22}outcomes: {summary['outcomes']}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            deltas = []
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                if previous[key]:
+                    deltas.append(f"{key} {100 * (summary[key] - previous[key]) / previous[key]:+.1f}%")
+            print(f"{'':<22}vs baseline: {', '.join(deltas)}")
+
+
+async def run(args: argparse.Namespace, ctx: Context, base_url: str) -> Dict[str, Dict[str, object]]:
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        for name in args.routes:
+            if args.warmup:
+                await run_phase(client, name, ctx, args.concurrency, args.warmup, 0)
+            stats = await run_phase(client, name, ctx, args.concurrency, args.duration, args.requests)
+            results[name] = stats.summary()
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the ShopBot app against local stand-ins.")
+    parser.add_argument("--routes", default=",".join(WORKLOADS),
+                        help=f"comma separated routes to drive, from: {', '.join(WORKLOADS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients per route")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to drive each route")
+    parser.add_argument("--requests", type=int, default=0, help="stop each route after this many requests")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each route")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the app")
+    parser.add_argument("--model", help="conversational model id or local path "
+                                         "(default: a tiny random model built in the workdir)")
+    parser.add_argument("--model-server", action="store_true",
+                        help="serve the model from one shared app.model_server process")
+    parser.add_argument("--marketplace-latency", type=float, default=0.0,
+                        help="artificial latency in seconds for each marketplace page")
+    parser.add_argument("--startup-timeout", type=float, default=300.0, help="seconds to wait for the app to boot")
+    parser.add_argument("--workdir", help="directory for the SQLite database (default: a temporary directory)")
+    parser.add_argument("--json-out", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+    args.routes = [name.strip() for name in args.routes.split(",") if name.strip()]
+    unknown = [name for name in args.routes if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["routes"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        db_path = workdir / "loadtest.db"
+        if db_path.exists():
+            db_path.unlink()
+        ctx = seed_database(db_path)
+        model = args.model or str(build_tiny_model(workdir / "tiny-model"))
+
+        marketplace = MarketplaceServer(free_port(), args.marketplace_latency)
+        marketplace.start()
+
+        env = {
+            "DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+            "SQL_ECHO": "0",
+            "PREWARM_ENABLED": "0",
+            "NLP_MODEL_NAME": model,
+            "MARKETPLACE_BASE_URL": marketplace.url,
+        }
+        processes = []
+        try:
+            if args.model_server:
+                model_port = free_port()
+                env["MODEL_SERVER_ADDRESS"] = f"127.0.0.1:{model_port}"
+                processes.append(start_model_server(env["MODEL_SERVER_ADDRESS"], model))
+                wait_for_port(model_port, processes[-1], args.startup_timeout)
+
+            app_port = free_port()
+            base_url = f"http://127.0.0.1:{app_port}"
+            processes.append(start_app(app_port, args.workers, env))
+            asyncio.run(wait_until_ready(base_url, processes[-1], args.startup_timeout))
+            results = asyncio.run(run(args, ctx, base_url))
+        finally:
+            for process in reversed(processes):
+                stop_process(process)
+            marketplace.stop()
+
+    print_report(results, baseline)
+    if args.json_out:
+        config = {key: value for key, value in vars(args).items() if key not in ("json_out", "baseline")}
+        Path(args.json_out).write_text(json.dumps({"config": config, "routes": results}, indent=2))
+
+    # Numbers for a route that never succeeded only time its error handling
+    failed = [name for name, summary in results.items() if not summary["ok"]]
+    if failed:
+        sys.exit(f"No successful responses for: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# loadtest/marketplace.py
+
+import asyncio
+from pathlib import Path
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, PlainTextResponse
+from starlette.routing import Route
+
+# Recorded search result pages, one per marketplace
+RECORDINGS_DIR = Path(__file__).parent / "recordings"
+
+
+def create_marketplace_app(latency: float = 0.0) -> Starlette:
+    """
+    Build a stand-in for all five marketplaces. Every request under /<site>/
+    returns that site's recorded search page, whatever the query, after an
+    optional artificial latency.
+    """
+    pages = {path.stem: path.read_text(encoding="utf-8") for path in RECORDINGS_DIR.glob("*.html")}
+
+    async def search_page(request):
+        site = request.path_params["site"]
+        if site not in pages:
+            return PlainTextResponse("Unknown marketplace", status_code=404)
+        if latency:
+            await asyncio.sleep(latency)
+        return HTMLResponse(pages[site])
+
+    return Starlette(routes=[Route("/{site}/{path:path}", search_page)])
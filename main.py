@@ -1,21 +1,59 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from app.auth.routes import router as auth_router
 from app.api import router as api_router  # Renaming to avoid confusion
-from database import init_db  # Ensure this import path is correct
+from database import init_db, AsyncSessionLocal  # Ensure this import path is correct
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi import Request
+from app.profiling import ProfilingMiddleware, ProfileStore, is_authorized
+from app.prewarm import PrewarmScheduler
+from app.nlp_module import load_local_model
+from config import settings
+from datetime import timedelta
 
 app = FastAPI()
 
+# Opt-in per-request profiling (see app/profiling.py)
+profile_store = ProfileStore(max_entries=settings.PROFILING_MAX_ENTRIES)
+app.add_middleware(
+    ProfilingMiddleware,
+    token=settings.PROFILING_TOKEN,
+    sample_rate=settings.PROFILING_SAMPLE_RATE,
+    store=profile_store,
+    exclude_paths=("/api/profiles",),
+)
+
 # Mount static files for serving CSS, JS, etc.
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Background crawler keeping popular searches warm
+prewarm_scheduler = PrewarmScheduler(
+    AsyncSessionLocal,
+    top_n=settings.PREWARM_TOP_N,
+    lookback=timedelta(hours=settings.PREWARM_LOOKBACK_HOURS),
+    workers=settings.PREWARM_WORKERS,
+    min_interval=settings.PREWARM_MIN_INTERVAL,
+    max_interval=settings.PREWARM_MAX_INTERVAL,
+    tick=settings.PREWARM_TICK,
+    site_interval=settings.PREWARM_SITE_INTERVAL,
+    lock_path=settings.PREWARM_LOCK_FILE,
+)
+
 # Initialize the database on startup
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    # Without a model server, load the model up front rather than on the first chat
+    if not settings.MODEL_SERVER_ADDRESS:
+        await load_local_model()
+    if settings.PREWARM_ENABLED:
+        prewarm_scheduler.start()
+
+# Stop background tasks on shutdown
+@app.on_event("shutdown")
+async def on_shutdown():
+    await prewarm_scheduler.stop()
 
 # Include authentication router
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
@@ -43,3 +81,26 @@ async def search_page(request: Request):
 @app.get("/api/test")
 def api_test():
     return {"message": "Welcome to the ShopBot API!"}
+
+def _check_profiling_token(request: Request):
+    if not is_authorized(request.scope, settings.PROFILING_TOKEN):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+
+# List the most recent request profiles
+@app.get("/api/profiles")
+async def list_profiles(request: Request):
+    _check_profiling_token(request)
+    return {"profiles": profile_store.list()}
+
+# Retrieve a single request profile as a summary, pstats text or collapsed stacks
+@app.get("/api/profiles/{request_id}")
+async def get_profile(request_id: str, request: Request, format: str = "summary"):
+    _check_profiling_token(request)
+    profile = profile_store.get(request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile found for this request id.")
+    if format == "pstats":
+        return PlainTextResponse(profile.pstats_text())
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed_stacks())
+    return profile.summary()
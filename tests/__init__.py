@@ -0,0 +1 @@
+#tests.__init__.py
\ No newline at end of file
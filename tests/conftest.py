@@ -0,0 +1,21 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Point the app at a throwaway SQLite database before anything imports database.py
+DB_PATH = Path(tempfile.mkdtemp()) / "test.db"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ["SQL_ECHO"] = "0"
+os.environ["PREWARM_ENABLED"] = "0"
+
+
+@pytest.fixture(scope="session")
+def seeded():
+    """
+    The load-test harness's seeded database: two users, a few products and
+    rated search history for the recommenders.
+    """
+    from loadtest.harness import seed_database
+    return seed_database(DB_PATH)
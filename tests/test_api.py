@@ -0,0 +1,198 @@
+import asyncio
+
+import httpx
+import pytest
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+import app.api as api
+import app.scraper as scraper
+from loadtest.harness import LOADTEST_EMAIL, LOADTEST_PASSWORD
+from app.models import SearchHistory
+from database import AsyncSessionLocal
+from main import app
+
+PRODUCTS = [
+    {"name": f"Phone {n}", "image": "img", "price": str(n), "link": f"https://example.com/{n}", "rating": "4"}
+    for n in range(5)
+]
+
+
+def _request(method, path, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(run())
+
+
+def _get(path, **kwargs):
+    return _request("GET", path, **kwargs)
+
+
+def _post(path, **kwargs):
+    return _request("POST", path, **kwargs)
+
+
+@pytest.fixture
+def fake_scrape(monkeypatch):
+    calls = []
+
+    async def scrape_all(product_name):
+        calls.append(product_name)
+        return PRODUCTS
+
+    monkeypatch.setattr(scraper, "scrape_all", scrape_all)
+    monkeypatch.setattr(scraper, "scrape_cache", scraper.ScrapeCache())
+    return calls
+
+
+def test_login_returns_token(seeded):
+    response = _post("/auth/login", json={"email": LOADTEST_EMAIL, "password": LOADTEST_PASSWORD})
+
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+
+
+def test_login_rejects_wrong_password(seeded):
+    response = _post("/auth/login", json={"email": LOADTEST_EMAIL, "password": "wrong"})
+
+    assert response.status_code == 401
+
+
+def test_chat_answers_and_records_history(seeded):
+    response = _post("/api/chat", json={"user_id": seeded.user_id, "message": "recommend something"})
+
+    assert response.status_code == 200
+    assert response.json()["response"].startswith("Based on your query")
+
+
+@pytest.mark.parametrize("route", ["user_based", "item_based"])
+def test_recommendations_by_user_return_rows(seeded, route):
+    response = _get(f"/api/recommendations/{route}/{seeded.user_id}")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] > 0
+    assert all(item["title"] for item in body["recommendations"])
+
+
+def test_recommendations_for_current_user(seeded):
+    response = _get("/api/recommendations", headers={"Authorization": f"Bearer {seeded.token}"})
+
+    assert response.status_code == 200
+    assert response.json()["recommendations"]
+
+
+def test_recommendations_are_paginated(seeded):
+    first = _get(f"/api/recommendations/item_based/{seeded.user_id}", params={"limit": 1}).json()
+    second = _get(f"/api/recommendations/item_based/{seeded.user_id}",
+                  params={"limit": 1, "cursor": first["next_cursor"]}).json()
+
+    assert api.decode_cursor(first["next_cursor"])[0] == 1
+    assert len(first["recommendations"]) == len(second["recommendations"]) == 1
+    assert first["recommendations"] != second["recommendations"]
+
+
+def test_recommendations_for_unknown_user_are_not_found(seeded):
+    assert _get("/api/recommendations/item_based/9999").status_code == 404
+
+
+def _scrape_page(cursor=None, product_name="phone", headers=None):
+    params = {"product_name": product_name, "limit": 2}
+    if cursor:
+        params["cursor"] = cursor
+    return _get("/api/scrape", params=params, headers=headers)
+
+
+def test_scrape_pages_are_served_from_one_scrape(fake_scrape):
+    first = _scrape_page().json()
+    second = _scrape_page(first["next_cursor"]).json()
+    last = _scrape_page(second["next_cursor"]).json()
+
+    assert [p["name"] for p in first["products"]] == ["Phone 0", "Phone 1"]
+    assert first["total"] == 5
+    assert [p["name"] for p in second["products"]] == ["Phone 2", "Phone 3"]
+    assert [p["name"] for p in last["products"]] == ["Phone 4"]
+    assert last["next_cursor"] is None
+    assert fake_scrape == ["phone"]
+
+
+def test_scrape_cursor_is_rejected_once_results_are_replaced(fake_scrape):
+    first = _scrape_page().json()
+
+    # The prewarm crawler stores a fresh scrape under the same search
+    scraper.scrape_cache.put("phone", PRODUCTS[::-1])
+    response = _scrape_page(first["next_cursor"])
+
+    assert response.status_code == 400
+    assert [p["name"] for p in _scrape_page().json()["products"]] == ["Phone 4", "Phone 3"]
+
+
+def test_scrape_cursor_is_rejected_once_results_expire(fake_scrape):
+    first = _scrape_page().json()
+
+    scraper.scrape_cache._entries.clear()
+    response = _scrape_page(first["next_cursor"])
+
+    assert response.status_code == 400
+    assert fake_scrape == ["phone"]
+
+
+def test_scrape_rejects_bad_cursor_before_scraping(fake_scrape):
+    response = _get("/api/scrape", params={"product_name": "phone", "cursor": "nope"})
+
+    assert response.status_code == 400
+    assert fake_scrape == []
+
+
+def _count_history(query):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(func.count(SearchHistory.id)).where(SearchHistory.query == query))
+            return result.scalar()
+    return asyncio.run(run())
+
+
+def test_scrape_records_signed_in_searches(seeded, fake_scrape):
+    headers = {"Authorization": f"Bearer {seeded.token}"}
+    first = _scrape_page(product_name="tablet", headers=headers).json()
+    _scrape_page(first["next_cursor"], product_name="tablet", headers=headers)
+    _get("/api/scrape", params={"product_name": "tablet"})
+
+    assert _count_history("search tablet") == 1
+
+
+def test_chat_search_uses_scrape_cache(seeded, fake_scrape):
+    scraper.scrape_cache.put("phone", PRODUCTS)
+
+    response = _post("/api/chat", json={"user_id": seeded.user_id, "message": "search phone"})
+
+    assert response.status_code == 200
+    assert "Phone 0" in response.json()["response"]
+    assert fake_scrape == []
+
+
+def test_decode_cursor():
+    assert api.decode_cursor(None) == (0, None)
+    assert api.decode_cursor(api.encode_cursor(20, "abc123")) == (20, "abc123")
+    for bad in ("20", "abc", api.encode_cursor(-1, "abc123"), api.encode_cursor(20, "")):
+        with pytest.raises(api.HTTPException):
+            api.decode_cursor(bad)
+
+
+def test_paginate():
+    items = list(range(5))
+
+    assert api.paginate(items, 0, 2, "snap") == ([0, 1], api.encode_cursor(2, "snap"))
+    assert api.paginate(items, 4, 2, "snap") == ([4], None)
+    assert api.paginate(items, 10, 2, "snap") == ([], None)
+
+
+def test_check_snapshot():
+    api.check_snapshot(None, "snap")
+    api.check_snapshot("snap", "snap")
+    for current in ("other", None):
+        with pytest.raises(api.HTTPException):
+            api.check_snapshot("snap", current)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import app.model_server as model_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_client_returns_none_without_server(tmp_path):
+    client = model_server.ModelClient(f"unix:{tmp_path / 'missing.sock'}")
+
+    assert asyncio.run(client.generate("hello", [])) is None
+
+
+def _fake_model(monkeypatch):
+    monkeypatch.setattr(model_server, "load_model", lambda name: ("tokenizer", "model"))
+    monkeypatch.setattr(model_server, "generate_text",
+                        lambda tokenizer, model, prompt, history: " ".join(history + [prompt]))
+
+
+def test_round_trip_through_server(monkeypatch, tmp_path):
+    _fake_model(monkeypatch)
+    address = f"unix:{tmp_path / 'model.sock'}"
+
+    async def run():
+        server = asyncio.create_task(model_server.ModelServer("tiny", address).serve())
+        client = model_server.ModelClient(address)
+        for _ in range(50):
+            if (tmp_path / "model.sock").exists():
+                break
+            await asyncio.sleep(0.01)
+        try:
+            return await asyncio.gather(*(client.generate(f"message {i}", ["hi"]) for i in range(3)))
+        finally:
+            server.cancel()
+
+    assert asyncio.run(run()) == ["hi message 0", "hi message 1", "hi message 2"]
+
+
+def _start_server_process(address, socket_path):
+    # Stand-in model, the server process is killed outright like a crashed one
+    code = (
+        "import asyncio, app.model_server as m\n"
+        "m.load_model = lambda name: ('tokenizer', 'model')\n"
+        "m.generate_text = lambda tokenizer, model, prompt, history: prompt\n"
+        f"asyncio.run(m.ModelServer('tiny', {address!r}).serve())\n"
+    )
+    if socket_path.exists():
+        socket_path.unlink()
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT)
+    for _ in range(500):
+        if socket_path.exists():
+            return process
+        time.sleep(0.01)
+    process.kill()
+    raise RuntimeError("Model server did not start")
+
+
+def _kill(process):
+    process.kill()
+    process.wait()
+
+
+def test_client_survives_server_restart_and_death(tmp_path):
+    socket_path = tmp_path / "model.sock"
+    address = f"unix:{socket_path}"
+
+    async def run():
+        client = model_server.ModelClient(address)
+        process = _start_server_process(address, socket_path)
+        try:
+            first = await client.generate("before", [])
+
+            # The pooled connection is stale after the restart
+            _kill(process)
+            process = _start_server_process(address, socket_path)
+            restarted = await client.generate("after restart", [])
+        finally:
+            _kill(process)
+
+        # With the server gone, callers get None and fall back
+        dead = await client.generate("after death", [])
+        return first, restarted, dead
+
+    assert asyncio.run(run()) == ("before", "after restart", None)
@@ -0,0 +1,27 @@
+import asyncio
+import logging
+import threading
+
+import app.nlp_module as nlp_module
+from app.model_server import ModelClient
+
+
+def test_fallback_warns_and_generates_off_the_event_loop(monkeypatch, tmp_path, caplog):
+    threads = []
+
+    def fake_generate(tokenizer, model, prompt, history):
+        threads.append(threading.current_thread().name)
+        return f"local: {prompt}"
+
+    monkeypatch.setattr(nlp_module, "model_client", ModelClient(f"unix:{tmp_path / 'missing.sock'}"))
+    monkeypatch.setattr(nlp_module, "load_model", lambda name: ("tokenizer", "model"))
+    monkeypatch.setattr(nlp_module, "generate_text", fake_generate)
+    monkeypatch.setattr(nlp_module, "model", None)
+    monkeypatch.setattr(nlp_module, "falling_back", False)
+
+    with caplog.at_level(logging.WARNING):
+        response = asyncio.run(nlp_module.generate_response("hello", []))
+
+    assert response == "local: hello"
+    assert threads[0].startswith("model")
+    assert "not reachable" in caplog.text
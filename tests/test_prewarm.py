@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+import app.prewarm as prewarm
+from app.models import Product
+from app.prewarm import PrewarmScheduler, popular_queries, refresh_interval, search_term
+from app.scraper import scrape_cache
+from database import AsyncSessionLocal
+
+
+def test_search_term_follows_chat_rule():
+    assert search_term("Search  Smart Watch ") == "smart watch"
+    assert search_term("recommend something") is None
+    assert search_term("search") is None
+
+
+def test_refresh_interval_follows_popularity():
+    assert refresh_interval(10, 10, 300, 3600) == 300
+    assert refresh_interval(5, 10, 300, 3600) == 600
+    assert refresh_interval(1, 100, 300, 3600) == 3600
+
+
+def test_popular_queries_reads_search_history(seeded):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            return await popular_queries(session, 3, datetime.utcnow() - timedelta(days=1))
+
+    popular = asyncio.run(run())
+
+    assert len(popular) == 3
+    assert all(hits >= 1 and not term.startswith("search") for term, hits in popular)
+
+
+def test_only_one_scheduler_holds_the_lock(tmp_path):
+    lock_path = str(tmp_path / "prewarm.lock")
+
+    async def run():
+        first = PrewarmScheduler(AsyncSessionLocal, tick=3600, lock_path=lock_path)
+        second = PrewarmScheduler(AsyncSessionLocal, tick=3600, lock_path=lock_path)
+        started = [first.start(), second.start()]
+        await first.stop()
+        third = PrewarmScheduler(AsyncSessionLocal, tick=3600, lock_path=lock_path)
+        started.append(third.start())
+        await third.stop()
+        return started
+
+    assert asyncio.run(run()) == [True, False, True]
+
+
+def test_concurrent_refreshes_cache_and_store_each_product_once(seeded, monkeypatch):
+    # Every search returns the same products, as popular searches often do
+    async def scrape_site(url):
+        await asyncio.sleep(0)
+        return [{"name": f"Prewarmed {i}", "price": "$10", "rating": "4.5 out of 5",
+                 "link": f"https://example.com/prewarmed/{i}"} for i in range(5)]
+
+    monkeypatch.setattr(prewarm, "SITE_SCRAPERS", {"amazon": scrape_site, "ebay": scrape_site})
+
+    async def run():
+        scheduler = PrewarmScheduler(AsyncSessionLocal, tick=60, site_interval=0)
+        await asyncio.gather(scheduler.refresh("phone", 300), scheduler.refresh("laptop", 300))
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Product.link, func.count(Product.id), func.max(Product.rating))
+                .where(Product.link.like("https://example.com/prewarmed/%"))
+                .group_by(Product.link)
+            )
+            return result.all()
+
+    rows = asyncio.run(run())
+
+    assert len(rows) == 5
+    assert all(count == 1 and rating == 4.5 for _, count, rating in rows)
+    assert len(scrape_cache.get("phone")) == 10
+    assert len(scrape_cache.get("laptop")) == 10
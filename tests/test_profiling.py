@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.profiling import ProfileStore, ProfilingMiddleware, profiled_call
+
+
+async def _app(scope, receive, send):
+    await asyncio.sleep(0.01)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(middleware, headers=(), query_string=b""):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/api/chat",
+             "headers": list(headers), "query_string": query_string}
+    asyncio.run(middleware(scope, None, send))
+    return messages
+
+
+def test_token_request_is_profiled_and_stored():
+    store = ProfileStore()
+    middleware = ProfilingMiddleware(_app, token="secret", store=store)
+
+    messages = _call(middleware, headers=[(b"x-profile-token", b"secret")])
+
+    profile_id = dict(messages[0]["headers"])[b"x-profile-id"].decode()
+    profile = store.get(profile_id)
+    assert profile.status_code == 200
+    assert profile.summary()["awaits"]
+
+
+def _busy_child(seconds=0.1):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def _busy_executor_call(seconds=0.1):
+    _busy_child(seconds)
+
+
+async def _gathering_app(scope, receive, send):
+    async def child():
+        await asyncio.sleep(0)
+        _busy_child()
+
+    await asyncio.gather(child(), child())
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        await asyncio.get_running_loop().run_in_executor(executor, profiled_call(_busy_executor_call))
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_work_in_child_tasks_and_executor_threads_is_profiled():
+    store = ProfileStore()
+    middleware = ProfilingMiddleware(_gathering_app, token="secret", store=store, sample_interval=0.001)
+
+    messages = _call(middleware, headers=[(b"x-profile-token", b"secret")])
+
+    profile = store.get(dict(messages[0]["headers"])[b"x-profile-id"].decode())
+    assert profile.cpu_time > 0.25
+    for name in ("_busy_child", "_busy_executor_call"):
+        assert name in profile.pstats_text()
+        assert name in profile.collapsed_stacks()
+
+
+def test_executor_calls_outside_profiled_requests_are_unchanged():
+    assert profiled_call(_busy_child) is _busy_child
+
+
+def test_request_without_token_is_not_profiled():
+    store = ProfileStore()
+    middleware = ProfilingMiddleware(_app, token="secret", store=store)
+
+    _call(middleware, headers=[(b"x-profile-token", b"wrong")])
+    _call(middleware, query_string=b"__profile=wrong")
+
+    assert store.list() == []
+
+
+def test_client_request_id_cannot_overwrite_profiles():
+    store = ProfileStore()
+    middleware = ProfilingMiddleware(_app, token="secret", store=store)
+    headers = [(b"x-profile-token", b"secret"), (b"x-request-id", b"same")]
+
+    _call(middleware, headers=headers)
+    _call(middleware, headers=headers)
+
+    profiles = store.list()
+    assert len(profiles) == 2
+    assert profiles[0]["request_id"] != profiles[1]["request_id"]
+    assert all(p["client_request_id"] == "same" for p in profiles)
+
+
+def test_sampling_without_token_is_refused(caplog):
+    store = ProfileStore()
+    with caplog.at_level(logging.WARNING):
+        middleware = ProfilingMiddleware(_app, sample_rate=1.0, store=store)
+
+    _call(middleware)
+
+    assert not middleware.enabled
+    assert store.list() == []
+    assert "sampling disabled" in caplog.text
@@ -0,0 +1,44 @@
+import time
+
+from app.scraper import ScrapeCache
+
+PRODUCTS = [{"name": "Phone", "image": "img", "price": "1", "link": "https://example.com/1", "rating": "4"}]
+
+
+def test_cache_hit_ignores_case_and_spacing():
+    cache = ScrapeCache()
+    cache.put("Smart  Watch", PRODUCTS)
+
+    assert cache.get("smart watch") == PRODUCTS
+    assert cache.get("phone") is None
+
+
+def test_cache_entries_expire():
+    cache = ScrapeCache(ttl=0.01)
+    cache.put("phone", PRODUCTS)
+    cache.put("laptop", PRODUCTS, ttl=60)
+    time.sleep(0.02)
+
+    assert cache.get("phone") is None
+    assert cache.get("laptop") == PRODUCTS
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ScrapeCache(max_entries=2)
+    cache.put("phone", PRODUCTS)
+    cache.put("laptop", PRODUCTS)
+    cache.get("phone")
+    cache.put("watch", PRODUCTS)
+
+    assert cache.get("laptop") is None
+    assert cache.get("phone") == PRODUCTS
+    assert cache.get("watch") == PRODUCTS
+
+
+def test_every_put_is_a_new_snapshot():
+    cache = ScrapeCache()
+    first = cache.put("phone", PRODUCTS)
+    second = cache.put("phone", PRODUCTS)
+
+    assert first != second
+    assert cache.get_entry("phone") == (second, PRODUCTS)